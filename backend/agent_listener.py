@@ -1,17 +1,38 @@
 # --- agent_listener.py ---
 # (Run this in a *separate* terminal from your simulator)
 
-import requests
-import json
+import asyncio
+import gzip
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Literal, Optional
+from pydantic import BaseModel, ConfigDict
+import httpx
+import numpy as np
+import orjson
 import time
 import os
 import sys
+import threading
+import uuid
+import chromadb
+from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 
+# --- LOGGING ---
+# Shared queued logger (see queued_logging.py in the repo root).
+# Set LOG_LEVEL=DEBUG to also see the verbose per-event dumps.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from queued_logging import get_logger
+logger = get_logger("agent_listener")
+
 # --- 1. CONFIGURATION ---
 
 # The address of your simulator's web server
 SIMULATOR_URL = "http://localhost:8000"
+# Server-Sent Events stream that pushes each tick's events as they're built
+SIMULATOR_STREAM_URL = f"{SIMULATOR_URL}/events"
+SIMULATOR_RECONNECT_SECONDS = 5
 
 # --- NEW ADDITION: Address for your 2nd server to *receive* reports ---
 REPORTING_SERVER_URL = "http://localhost:8001" 
@@ -22,74 +43,379 @@ load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
 if not OPENROUTER_API_KEY:
-    print("Error: OPENROUTER_API_KEY not found. Please set it in a .env file.")
+    logger.error("Error: OPENROUTER_API_KEY not found. Please set it in a .env file.")
     sys.exit(1)
 
+# Network readings above these count as a spike for the Orchestrator
+LATENCY_SPIKE_MS = 500.0
+PACKET_LOSS_SPIKE_PERCENT = 5.0
+
 # The specific model identifier on OpenRouter
 NEMOTRON_MODEL_ID = "nvidia/nemotron-nano-9b-v2" # Using Nano 9B as requested
 
 # --- 2. OPENROUTER API CLIENT (THE "BRAIN" CONNECTOR) ---
 
-def call_nemotron(prompt, return_json=False):
+# One pooled client for every outbound request (Nemotron, simulator and
+# reporter), so connections are kept alive across calls and ticks instead
+# of paying TCP/TLS setup each time.
+HTTP_CLIENT = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    timeout=30
+)
+
+# Auth is sent per request so it only ever goes to OpenRouter
+OPENROUTER_HEADERS = {
+    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+    "Content-Type": "application/json"
+}
+
+# Max number of in-flight Nemotron requests per tick (simple rate limit)
+NEMOTRON_CONCURRENCY = 16
+
+# Fire-and-forget tasks (e.g. report uploads); references are held here so
+# they are not garbage collected before they finish.
+BACKGROUND_TASKS = set()
+
+def run_in_background(coro):
+    """Schedules a coroutine without waiting for it."""
+    task = asyncio.create_task(coro)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+    return task
+
+class _JsonObjectScanner:
+    """
+    Follows streamed text and reports when the first top-level JSON object
+    is complete, so we can stop reading without waiting for end-of-stream.
+    """
+    def __init__(self):
+        self.text = []
+        self.pos = 0
+        self.start = None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, chunk):
+        """Adds a chunk; returns the object's JSON text once it has closed."""
+        self.text.append(chunk)
+        for ch in chunk:
+            self.pos += 1
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"' and self.start is not None:
+                self.in_string = True
+            elif ch == '{':
+                if self.start is None:
+                    self.start = self.pos - 1
+                self.depth += 1
+            elif ch == '}' and self.start is not None:
+                self.depth -= 1
+                if self.depth == 0:
+                    return "".join(self.text)[self.start:self.pos]
+        return None
+
+async def call_nemotron(system_prompt, user_content, return_json=False, max_tokens=None, response_model=None):
     """
-    A generic function to call the Nemotron model via OpenRouter.
+    A generic coroutine to call the Nemotron model via OpenRouter.
+    The static system prompt goes first and the per-call payload is the
+    user turn. (Both system prompts are well under the ~1024-token minimum
+    for provider prefix caching, so no prompt_cache_key is sent.)
+    The response is streamed; JSON calls return as soon as the top-level
+    object closes instead of waiting for the rest of the stream.
+    With a pydantic 'response_model', decoding is constrained to its JSON
+    schema and a validated model instance is returned.
     """
+    if response_model is not None:
+        return_json = True
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {
+                "name": response_model.__name__,
+                "schema": response_model.model_json_schema(),
+                "strict": True
+            }
+        }
+    elif return_json:
+        response_format = {"type": "json_object"}
+    else:
+        response_format = None
+
+    def parse(text):
+        if response_model is not None:
+            return response_model.model_validate_json(text)
+        return orjson.loads(text)
+
     try:
-        response = requests.post(
+        async with HTTP_CLIENT.stream(
+            "POST",
             url="https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
+            headers=OPENROUTER_HEADERS,
+            content=orjson.dumps({
                 "model": NEMOTRON_MODEL_ID,
-                "messages": [{"role": "user", "content": prompt}],
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_content}
+                ],
                 # Request JSON output if needed
-                "response_format": {"type": "json_object"} if return_json else None
-            }
-        )
+                "response_format": response_format,
+                "max_tokens": max_tokens,
+                "stream": True
+            })
+        ) as response:
         
-        if response.status_code != 200:
-            print(f"Error calling Nemotron: {response.status_code} - {response.text}")
-            return None
-
-        content = response.json()['choices'][0]['message']['content']
+            if response.status_code != 200:
+                await response.aread()
+                logger.error(f"Error calling Nemotron: {response.status_code} - {response.text}")
+                return None
+
+            scanner = _JsonObjectScanner() if return_json else None
+            content = []
+            async for line in response.aiter_lines():
+                # SSE: payload lines start with "data: ", others are keep-alive comments
+                if not line.startswith("data: "):
+                    continue
+                data = line[len("data: "):]
+                if data == "[DONE]":
+                    break
+
+                chunk = orjson.loads(data)
+                if "error" in chunk:
+                    logger.error(f"Error calling Nemotron: {chunk['error']}")
+                    return None
+                if not chunk.get("choices"):
+                    continue
+                delta = chunk["choices"][0].get("delta", {}).get("content")
+                if not delta:
+                    continue
+
+                if scanner:
+                    obj_text = scanner.feed(delta)
+                    if obj_text is not None:
+                        # Leaving the 'async with' closes the stream early
+                        return parse(obj_text)
+                else:
+                    content.append(delta)
         
         if return_json:
-            # Parse the JSON string from the model's content
-            return json.loads(content)
+            # Stream ended without a complete object; parse what we got
+            return parse("".join(scanner.text))
         else:
-            return content
+            return "".join(content)
 
     except Exception as e:
-        print(f"An error occurred during the Nemotron API call: {e}")
+        logger.error(f"An error occurred during the Nemotron API call: {e}")
         return None
 
 # --- 3. AGENT 1: "PERCEPTION" AGENT ---
 
-def get_event_analysis(text):
+class PerceptionOut(BaseModel):
+    """Perception result for one text of a batch."""
+    model_config = ConfigDict(extra="forbid")
+
+    id: int
+    sentiment: Literal["positive", "negative", "neutral"]
+    topic: Literal["network_signal", "billing", "customer_service", "app_functionality", "other"]
+    urgency: Literal["high", "medium", "low"]
+
+class PerceptionBatchOut(BaseModel):
+    """Schema the Perception call is constrained to."""
+    model_config = ConfigDict(extra="forbid")
+
+    results: list[PerceptionOut]
+
+# Static instructions only -- the batch of texts is sent as the user turn.
+# The output shape is enforced by PerceptionBatchOut's JSON schema, so the
+# prompt only needs to explain what each field means.
+SYSTEM_PROMPT_PERCEPTION = """
+You are a sentiment analysis expert for a mobile network operator. The user
+message is a JSON array of customer texts, each {"id": <int>, "text": <string>}.
+Classify every text independently and return one result per id.
+
+- sentiment: the customer's feeling towards the company. For support logs,
+  judge the customer's side, not the agent's reply.
+- topic: network_signal (coverage, dropped calls, slow data, outages),
+  billing (charges, payments, promotions, plans), customer_service (agents,
+  wait times, stores), app_functionality (app crashes, login, bugs), or other.
+- urgency: high (service unusable, outage, public escalation, threat to
+  cancel), medium (ongoing problem that degrades service or costs money),
+  low (praise, general questions, minor annoyances).
+"""
+
+class SemanticCache:
     """
-    Uses Nemotron to analyze text for sentiment, topic, and urgency.
+    Caches Perception results keyed on an embedding of the input text,
+    so paraphrases of an already-analyzed complaint skip the LLM call.
+    Entries are stored in a local Chroma collection and evicted LFU.
     """
-    print(f"🧠 [Agent 1] Analyzing text: '{text[:50]}...'")
-    
-    prompt = f"""
-    You are a sentiment analysis expert. Analyze the following customer text. 
-    Respond with a single JSON object containing:
-    1. "sentiment": "positive", "negative", or "neutral".
-    2. "topic": "network_signal", "billing", "customer_service", "app_functionality", or "other".
-    3. "urgency": "high", "medium", or "low".
-
-    Text: "{text}"
+    EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+    HIT_THRESHOLD = 0.92 # Cosine similarity to reuse a cached analysis
+    MAX_CACHE = 5000
+
+    def __init__(self, path):
+        self.model = SentenceTransformer(self.EMBEDDING_MODEL)
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection = self.client.get_or_create_collection(
+            name="perception_cache",
+            metadata={"hnsw:space": "cosine"}
+        )
+        self.lock = threading.Lock()
+        # Hit counts per entry, used for LFU eviction
+        stored = self.collection.get(include=["metadatas"])
+        self.hits = {
+            entry_id: meta.get("hits", 0)
+            for entry_id, meta in zip(stored["ids"], stored["metadatas"])
+        }
+
+    def embed(self, texts):
+        """
+        Encodes a list of texts in one pass; the vectors are reused for
+        both lookup and insert.
+        """
+        return self.model.encode(texts, normalize_embeddings=True).tolist()
+
+    def lookup(self, embedding):
+        """
+        Returns (analysis, similarity) for the nearest cached entry, or
+        (None, 0.0) when the cache is empty. 'analysis' is only set on a hit.
+        """
+        if not self.hits:
+            return None, 0.0
+
+        result = self.collection.query(
+            query_embeddings=[embedding],
+            n_results=1,
+            include=["metadatas", "distances"]
+        )
+        if not result["ids"][0]:
+            return None, 0.0
+
+        entry_id = result["ids"][0][0]
+        meta = result["metadatas"][0][0]
+        similarity = 1.0 - result["distances"][0][0]
+        if similarity < self.HIT_THRESHOLD:
+            return None, similarity
+
+        with self.lock:
+            self.hits[entry_id] = self.hits.get(entry_id, 0) + 1
+            meta = {**meta, "hits": self.hits[entry_id]}
+        self.collection.update(ids=[entry_id], metadatas=[meta])
+        return orjson.loads(meta["analysis"]), similarity
+
+    def add(self, embedding, text, analysis):
+        """Stores a fresh analysis, evicting the least-used entry if full."""
+        entry_id = uuid.uuid4().hex
+        with self.lock:
+            evicted = None
+            if len(self.hits) >= self.MAX_CACHE:
+                evicted = min(self.hits, key=self.hits.get)
+                del self.hits[evicted]
+            self.hits[entry_id] = 0
+
+        if evicted:
+            self.collection.delete(ids=[evicted])
+        self.collection.add(
+            ids=[entry_id],
+            embeddings=[embedding],
+            metadatas=[{"analysis": orjson.dumps(analysis).decode(), "hits": 0}],
+            documents=[text]
+        )
+
+SEMANTIC_CACHE = SemanticCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), "semantic_cache"))
+
+# Token budget per text: one schema-constrained 4-field result
+PERCEPTION_MAX_TOKENS_PER_TEXT = 48
+
+# Max texts classified by a single Nemotron call
+PERCEPTION_BATCH_SIZE = 32
+
+async def classify_texts(texts):
     """
-    
-    analysis = call_nemotron(prompt, return_json=True)
-    if analysis:
-        print(f"✅ [Agent 1] Analysis complete: {analysis}")
-    return analysis
+    Sends one Nemotron call that classifies a whole batch of texts.
+    Returns a list of analyses aligned with 'texts' (None where missing).
+    """
+    payload = orjson.dumps([{"id": i, "text": t} for i, t in enumerate(texts)]).decode()
+    response = await call_nemotron(
+        SYSTEM_PROMPT_PERCEPTION, payload,
+        max_tokens=PERCEPTION_MAX_TOKENS_PER_TEXT * len(texts),
+        response_model=PerceptionBatchOut
+    )
+
+    analyses = [None] * len(texts)
+    if not response:
+        return analyses
+    for item in response.results:
+        if 0 <= item.id < len(texts):
+            analyses[item.id] = item.model_dump(exclude={"id"})
+    return analyses
+
+async def analyze_batch(texts):
+    """
+    Uses Nemotron to analyze texts for sentiment, topic, and urgency.
+    Paraphrases of previously analyzed text are served from SEMANTIC_CACHE;
+    everything else is classified in as few API calls as possible.
+    """
+    if not texts:
+        return []
+
+    # Embedding and vector search are CPU/disk bound; keep them off the loop
+    embeddings = await asyncio.to_thread(SEMANTIC_CACHE.embed, texts)
+    lookups = await asyncio.gather(
+        *(asyncio.to_thread(SEMANTIC_CACHE.lookup, e) for e in embeddings)
+    )
+
+    analyses = [None] * len(texts)
+    misses = [] # Indexes of texts that need the model
+    for i, (cached, similarity) in enumerate(lookups):
+        if cached:
+            logger.debug(f"⚡ [Agent 1] Cache hit ({similarity:.2f}) for: '{texts[i][:50]}...'")
+            analyses[i] = cached
+        else:
+            misses.append(i)
+
+    if not misses:
+        return analyses
+
+    logger.info(f"🧠 [Agent 1] Analyzing {len(misses)} texts in batches of up to {PERCEPTION_BATCH_SIZE}...")
+
+    sem = asyncio.Semaphore(NEMOTRON_CONCURRENCY)
+
+    async def classify_chunk(chunk):
+        async with sem:
+            return await classify_texts([texts[i] for i in chunk])
+
+    chunks = [misses[i:i + PERCEPTION_BATCH_SIZE] for i in range(0, len(misses), PERCEPTION_BATCH_SIZE)]
+    results = await asyncio.gather(*(classify_chunk(c) for c in chunks))
+
+    for chunk, chunk_analyses in zip(chunks, results):
+        for i, analysis in zip(chunk, chunk_analyses):
+            if analysis:
+                logger.debug(f"✅ [Agent 1] Analysis complete: {analysis}")
+                analyses[i] = analysis
+                await asyncio.to_thread(SEMANTIC_CACHE.add, embeddings[i], texts[i], analysis)
+    return analyses
 
 # --- 4. AGENT 2/LT: "HAPPINESS TRACKER" AGENT (STATEFUL) ---
 
+@dataclass(slots=True)
+class RegionState:
+    """Moving-average state for a single region."""
+    short_term_scores: deque
+    long_term_scores: deque
+    history: deque # Added history for graphing
+    short_term_sum: float = 0.0 # Running sums for O(1) averages
+    long_term_sum: float = 0.0
+    short_term_avg: float = 0.0
+    long_term_avg: float = 0.0
+    was_above: Optional[bool] = None # For crossover detection
+    state: str = "MAINTAIN_NEUTRAL"
+
 class HappinessTracker:
     """
     A stateful agent that calculates short-term and long-term happiness
@@ -101,161 +427,182 @@ class HappinessTracker:
     GRAPH_HISTORY_LENGTH = 50 # How many data points to show on the graph
     
     def __init__(self):
-        self.regions = {}
+        self.regions: dict[str, RegionState] = {}
+
+    def _create_region(self, region):
+        """Initializes a new region the first time we see it."""
+        region_data = RegionState(
+            short_term_scores=deque(maxlen=self.SHORT_TERM_WINDOW),
+            long_term_scores=deque(maxlen=self.LONG_TERM_WINDOW),
+            history=deque(maxlen=self.GRAPH_HISTORY_LENGTH)
+        )
+        self.regions[region] = region_data
+        return region_data
 
     def _get_or_create_region(self, region):
-        """Initializes a new region if it's the first time we see it."""
-        if region not in self.regions:
-            self.regions[region] = {
-                "short_term_scores": [],
-                "long_term_scores": [],
-                "short_term_avg": 0,
-                "long_term_avg": 0,
-                "was_above": None, # For crossover detection
-                "state": "MAINTAIN_NEUTRAL",
-                "history": [] # Added history for graphing
-            }
-        return self.regions[region]
+        """Returns the region's state, creating it if needed."""
+        return self.regions.get(region) or self._create_region(region)
 
     def _update_state(self, region_data):
         """Updates the region's label based on moving average crossovers."""
-        sma = region_data["short_term_avg"]
-        lma = region_data["long_term_avg"]
-        is_above = sma > lma
+        is_above = region_data.short_term_avg > region_data.long_term_avg
         
         # Only update state if LMA has enough data to be meaningful
-        if len(region_data["long_term_scores"]) < self.LONG_TERM_WINDOW:
-            region_data["state"] = "PRIMING" # State before we "trust" the label
+        if len(region_data.long_term_scores) < self.LONG_TERM_WINDOW:
+            region_data.state = "PRIMING" # State before we "trust" the label
             return
 
         # Initialize on first run after priming
-        if region_data["was_above"] is None:
-            region_data["was_above"] = is_above
+        if region_data.was_above is None:
+            region_data.was_above = is_above
             return
 
         # Check for crossovers
-        if is_above and not region_data["was_above"]:
-            region_data["state"] = "TRENDING_UP" # Golden Cross
-        elif not is_above and region_data["was_above"]:
-            region_data["state"] = "TRENDING_DOWN" # Death Cross
+        if is_above and not region_data.was_above:
+            region_data.state = "TRENDING_UP" # Golden Cross
+        elif not is_above and region_data.was_above:
+            region_data.state = "TRENDING_DOWN" # Death Cross
         # No crossover, maintain state based on position
         elif is_above:
-            region_data["state"] = "MAINTAIN_GOOD"
+            region_data.state = "MAINTAIN_GOOD"
         else:
-            region_data["state"] = "MAINTAIN_POOR"
+            region_data.state = "MAINTAIN_POOR"
         
-        region_data["was_above"] = is_above
+        region_data.was_above = is_above
 
     def add_sentiment_score(self, region, score):
         """Adds a new score and recalculates averages and state."""
         region_data = self._get_or_create_region(region)
         
-        # Update short-term
-        region_data["short_term_scores"].append(score)
-        if len(region_data["short_term_scores"]) > self.SHORT_TERM_WINDOW:
-            region_data["short_term_scores"].pop(0)
+        # Update short-term (the deque evicts the oldest score by itself)
+        short_scores = region_data.short_term_scores
+        evicted = short_scores[0] if len(short_scores) == short_scores.maxlen else 0.0
+        short_scores.append(score)
+        region_data.short_term_sum += score - evicted
         
         # Update long-term
-        region_data["long_term_scores"].append(score)
-        if len(region_data["long_term_scores"]) > self.LONG_TERM_WINDOW:
-            region_data["long_term_scores"].pop(0)
-
-        # Recalculate averages
-        if region_data["short_term_scores"]:
-            region_data["short_term_avg"] = sum(region_data["short_term_scores"]) / len(region_data["short_term_scores"])
-        if region_data["long_term_scores"]:
-            region_data["long_term_avg"] = sum(region_data["long_term_scores"]) / len(region_data["long_term_scores"])
+        long_scores = region_data.long_term_scores
+        evicted = long_scores[0] if len(long_scores) == long_scores.maxlen else 0.0
+        long_scores.append(score)
+        region_data.long_term_sum += score - evicted
+
+        # Recalculate averages from the running sums
+        region_data.short_term_avg = region_data.short_term_sum / len(short_scores)
+        region_data.long_term_avg = region_data.long_term_sum / len(long_scores)
             
         # Update the long-term state label
         self._update_state(region_data)
         
         # Save data point for the graph
-        region_data["history"].append(region_data["short_term_avg"])
-        if len(region_data["history"]) > self.GRAPH_HISTORY_LENGTH:
-            region_data["history"].pop(0)
+        region_data.history.append(region_data.short_term_avg)
 
-        print(f"📈 [State Agent] {region} Happiness: [Short: {region_data['short_term_avg']:.2f}, Long: {region_data['long_term_avg']:.2f}, State: {region_data['state']}]")
+        logger.info(f"📈 [State Agent] {region} Happiness: [Short: {region_data.short_term_avg:.2f}, Long: {region_data.long_term_avg:.2f}, State: {region_data.state}]")
 
     def get_region_snapshot(self, region):
-        """Gets all current data for a region."""
-        return self._get_or_create_region(region).copy()
+        """Gets all current data for a region (JSON-serializable copy)."""
+        snapshot = asdict(self._get_or_create_region(region))
+        for key in ("short_term_scores", "long_term_scores", "history"):
+            snapshot[key] = list(snapshot[key])
+        # Running sums are internal bookkeeping
+        del snapshot["short_term_sum"], snapshot["long_term_sum"]
+        return snapshot
 
 # --- 5. AGENT 4: "ORCHESTRATOR" AGENT ---
 
-def get_proactive_decision(region_name, data_bundle):
+# The Tools catalog is static; only the region name and its data bundle
+# change per call, so they are sent as the user turn.
+SYSTEM_PROMPT_ORCHESTRATOR = """
+You are a T-Mobile Operations Manager. The user message contains the name of
+a region and its real-time DATA. Analyze the data and decide on a single,
+proactive action for that region.
+The 'state' is 'PRIMING' until 10 events are received. After 10 events,
+'MAINTAIN_GOOD' or 'MAINTAIN_POOR' are trusted labels.
+
+Available Actions (Tools):
+1. send_alert(team, summary, priority): 
+   (Teams: 'NetworkOps', 'BillingSupport', 'Marketing', 'AppDev')
+   (Priority: 'P0', 'P1', 'P2', 'P3')
+2. draft_social_reply(original_text, key_points): 
+   (Drafts a reply for a human to review. Use for high-urgency public posts.)
+3. log_and_monitor(reason): 
+   (If the issue is minor or 'PRIMING'. 'reason' explains why.)
+
+Your Task: Respond *only* with the JSON for the single best action to take.
+Example: {"action": "send_alert", "parameters": {"team": "NetworkOps", "summary": "...", "priority": "P1"}}
+"""
+
+async def get_proactive_decision(region_name, data_bundle):
     """
     Uses Nemotron to make a high-level decision based on all available data.
     """
-    print(f"\n🤔 [Agent 4] Making proactive decision for {region_name}...")
+    logger.info(f"\n🤔 [Agent 4] Making proactive decision for {region_name}...")
     
     # Cleanly format the data for the prompt
-    prompt_data = json.dumps(data_bundle, indent=2)
-    
-    prompt = f"""
-    You are a T-Mobile Operations Manager. Analyze the following real-time data 
-    from the '{region_name}' region and decide on a single, proactive action.
-    The 'state' is 'PRIMING' until 10 events are received. After 10 events,
-    'MAINTAIN_GOOD' or 'MAINTAIN_POOR' are trusted labels.
-
-    DATA:
-    {prompt_data}
-
-    Available Actions (Tools):
-    1. send_alert(team, summary, priority): 
-       (Teams: 'NetworkOps', 'BillingSupport', 'Marketing', 'AppDev')
-       (Priority: 'P0', 'P1', 'P2', 'P3')
-    2. draft_social_reply(original_text, key_points): 
-       (Drafts a reply for a human to review. Use for high-urgency public posts.)
-    3. log_and_monitor(reason): 
-       (If the issue is minor or 'PRIMING'. 'reason' explains why.)
-
-    Your Task: Respond *only* with the JSON for the single best action to take.
-    Example: {{"action": "send_alert", "parameters": {{"team": "NetworkOps", "summary": "...", "priority": "P1"}}}}
-    """
+    prompt_data = orjson.dumps(data_bundle, option=orjson.OPT_INDENT_2).decode()
+    user_content = f"REGION: {region_name}\n\nDATA:\n{prompt_data}"
     
-    decision = call_nemotron(prompt, return_json=True)
+    decision = await call_nemotron(
+        SYSTEM_PROMPT_ORCHESTRATOR, user_content,
+        return_json=True
+    )
     return decision
 
 # --- 6. SIMULATOR DATA FETCHER (FROM YOUR SCRIPT) ---
 
-def fetch_latest_data():
-    """Fetches the latest batch of events from the simulator."""
-    try:
-        response = requests.get(SIMULATOR_URL)
-        if response.status_code == 200:
-            events = response.json()
-            return events
-        else:
-            print(f"Error: Server returned status code {response.status_code}")
-            return None
-    except requests.exceptions.ConnectionError:
-        print("Error: Could not connect to the simulator. Is simulator.py running?")
-        return None
-    except json.JSONDecodeError:
-        print("Error: Received invalid JSON from the server.")
-        return None
+async def stream_events():
+    """
+    Yields each batch of events the moment the simulator publishes it
+    (Server-Sent Events), reconnecting if the stream drops.
+    """
+    while True:
+        try:
+            # No read timeout: the stream is idle between ticks
+            async with HTTP_CLIENT.stream(
+                "GET", SIMULATOR_STREAM_URL, timeout=httpx.Timeout(30, read=None)
+            ) as response:
+                if response.status_code != 200:
+                    logger.error(f"Error: Server returned status code {response.status_code}")
+                else:
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data: "):
+                            continue
+                        try:
+                            yield orjson.loads(line[len("data: "):])
+                        except orjson.JSONDecodeError:
+                            logger.error("Error: Received invalid JSON from the server.")
+        except httpx.ConnectError:
+            logger.error("Error: Could not connect to the simulator. Is simulator.py running?")
+        except httpx.TransportError as e:
+            logger.error(f"Error: Lost the simulator event stream: {e}")
+
+        await asyncio.sleep(SIMULATOR_RECONNECT_SECONDS)
 
 # --- NEW ADDITION: Function to send reports to a second server ---
-def send_report_to_server(report_data):
+async def send_report_to_server(report_data):
     """
     Sends the agent's final decision to the reporting server.
     """
     if not report_data:
         return
         
-    print(f"📤 [Action Agent] Sending report to {REPORTING_SERVER_URL}...")
+    logger.info(f"📤 [Action Agent] Sending report to {REPORTING_SERVER_URL}...")
     try:
-        response = requests.post(REPORTING_SERVER_URL, json=report_data)
+        # Bundles carry raw post text, so they compress well
+        response = await HTTP_CLIENT.post(
+            REPORTING_SERVER_URL,
+            content=gzip.compress(orjson.dumps(report_data)),
+            headers={"Content-Type": "application/json", "Content-Encoding": "gzip"}
+        )
         if response.status_code == 200:
-            print(f"✅ [Action Agent] Report successfully sent.")
+            logger.info(f"✅ [Action Agent] Report successfully sent.")
         else:
-            print(f"❗️ [Action Agent] Reporting server returned status {response.status_code}")
+            logger.warning(f"❗️ [Action Agent] Reporting server returned status {response.status_code}")
             
-    except requests.exceptions.ConnectionError:
-        print(f"❗️ [Action Agent] FAILED to connect to reporting server at {REPORTING_SERVER_URL}.")
-        print("   Is your second server running?")
+    except httpx.ConnectError:
+        logger.warning(f"❗️ [Action Agent] FAILED to connect to reporting server at {REPORTING_SERVER_URL}.")
+        logger.warning("   Is your second server running?")
     except Exception as e:
-        print(f"❗️ [Action Agent] An unknown error occurred while sending report: {e}")
+        logger.error(f"❗️ [Action Agent] An unknown error occurred while sending report: {e}")
 # --- END NEW ADDITION ---
 
 
@@ -264,140 +611,199 @@ def print_happiness_graphs(tracker):
     """
     Prints simple ASCII line graphs for the short-term happiness
     of each region to the console.
+    Each region's bars are filled in one NumPy pass and the whole report
+    is logged as a single record.
     """
-    print("\n" + "="*50)
-    print(f"📊 60-SECOND HAPPINESS REPORT ({time.strftime('%H:%M:%S')}) 📊")
-    print("="*50)
-    
     GRAPH_WIDTH = 40
     POSITIVE_CHAR = '█'
     NEGATIVE_CHAR = '░'
     ZERO_CHAR = '─'
 
+    def scale_to_graph(values):
+        scaled = ((values + 1) / 2 * GRAPH_WIDTH).astype(np.int32)
+        return np.clip(scaled, 0, GRAPH_WIDTH)
+
+    zero_point = int(scale_to_graph(np.zeros(1))[0])
+    columns = np.arange(GRAPH_WIDTH + 1)
+
+    lines = [
+        "\n" + "="*50,
+        f"📊 60-SECOND HAPPINESS REPORT ({time.strftime('%H:%M:%S')}) 📊",
+        "="*50
+    ]
+
     for region, data in tracker.regions.items():
-        if not data["history"]:
+        if not data.history:
             continue
             
-        print(f"\nRegion: {region} (State: {data['state']})")
-        print(f"  (Negative) <{' '*(GRAPH_WIDTH//2 - 2)} 0 {' '*(GRAPH_WIDTH//2 - 2)}> (Positive)")
-        
-        def scale_value_to_graph(value):
-            scaled = int((value + 1) / 2 * GRAPH_WIDTH)
-            return max(0, min(scaled, GRAPH_WIDTH))
+        lines.append(f"\nRegion: {region} (State: {data.state})")
+        lines.append(f"  (Negative) <{' '*(GRAPH_WIDTH//2 - 2)} 0 {' '*(GRAPH_WIDTH//2 - 2)}> (Positive)")
 
-        zero_point = scale_value_to_graph(0)
-        
-        for val in data["history"]:
-            graph_line = [' '] * (GRAPH_WIDTH + 1)
-            pos = scale_value_to_graph(val)
-            
-            if pos > zero_point:
-                for i in range(zero_point, pos + 1):
-                    graph_line[i] = POSITIVE_CHAR
-            elif pos < zero_point:
-                for i in range(pos, zero_point):
-                    graph_line[i] = NEGATIVE_CHAR
-            
-            graph_line[zero_point] = ZERO_CHAR # Draw the zero axis
-            print(f"  {''.join(graph_line)} | {val: .2f}")
-    print("\n" + "="*50)
+        values = np.fromiter(data.history, dtype=np.float64, count=len(data.history))
+        positions = scale_to_graph(values)[:, None]
+
+        # One row per history point: fill from the zero axis out to the value
+        grid = np.full((len(values), GRAPH_WIDTH + 1), ' ', dtype='<U1')
+        grid[(columns >= zero_point) & (columns <= positions) & (positions > zero_point)] = POSITIVE_CHAR
+        grid[(columns >= positions) & (columns < zero_point)] = NEGATIVE_CHAR
+        grid[:, zero_point] = ZERO_CHAR # Draw the zero axis
+
+        # View each row of single characters as one fixed-width string
+        rows = grid.view(f'<U{GRAPH_WIDTH + 1}').ravel()
+        lines.extend(f"  {row} | {val: .2f}" for row, val in zip(rows, values))
+
+    lines.append("\n" + "="*50)
+    logger.info("\n".join(lines))
 
 
 # --- 7. MAIN AGENTIC LOOP ---
 
-def main():
-    print("--- 🚀 Real-Time AGENTIC Listener START ---")
-    print(f"Polling {SIMULATOR_URL} every 5 seconds...")
-    print("Press Ctrl+C to stop.\n")
+def decision_signature(state, region_data):
+    """
+    Summarizes what the Orchestrator's decision depends on for one tick:
+    the state label, the most urgent post, and whether the network spiked.
+    """
+    urgency_rank = {"low": 0, "medium": 1, "high": 2}
+    max_urgency = max(
+        (post["analysis"].get("urgency") for post in region_data["analyzed_posts"]),
+        key=lambda u: urgency_rank.get(u, -1),
+        default=None
+    )
+    network_spike = any(
+        m.get("latency_ms", 0) > LATENCY_SPIKE_MS
+        or m.get("packet_loss_percent", 0) > PACKET_LOSS_SPIKE_PERCENT
+        for m in region_data["network_metrics"]
+    )
+    return (state, max_urgency, network_spike)
+
+async def process_tick(tracker, events, last_decisions):
+    """
+    Runs one PERCEIVE -> DECIDE -> ACT pass over a batch of events.
+    All texts in the tick are classified together by analyze_batch.
+    'last_decisions' maps region -> (signature, decision) across ticks.
+    """
+    # --- LOOP 1: PERCEIVE & ANALYZE ---
+    grouped_data = {}
+    pending = [] # (region, event) pairs, in original event order
+    texts = []
+    for event in events:
+        region = event.get('region')
+        if not region:
+            continue 
+        
+        if region not in grouped_data:
+            grouped_data[region] = {
+                "network_metrics": [],
+                "analyzed_posts": []
+            }
+        
+        etype = event['event_type']
+        if etype == 'network_metric':
+            grouped_data[region]["network_metrics"].append(event)
+        elif etype in ('social_media_post', 'support_interaction'):
+            text = event.get('text') or event.get('log')
+            if not text:
+                continue
+                
+            pending.append((region, event))
+            texts.append(text)
+
+    analyses = await analyze_batch(texts)
+
+    # Feed the tracker in the original event order
+    score_map = {'positive': 1, 'negative': -1, 'neutral': 0}
+    for (region, event), analysis in zip(pending, analyses):
+        if analysis:
+            score = score_map.get(analysis.get('sentiment', 'neutral'), 0)
+            tracker.add_sentiment_score(region, score)
+            event['analysis'] = analysis
+            grouped_data[region]["analyzed_posts"].append(event)
     
+    # --- LOOP 2: DECIDE & ACT ---
+    for region, data in grouped_data.items():
+        if region == 'global' or (not data['network_metrics'] and not data['analyzed_posts']):
+            continue 
+        
+        happiness_snapshot = tracker.get_region_snapshot(region)
+        final_bundle = {
+            "happiness_state": happiness_snapshot,
+            "network_metrics": data['network_metrics'],
+            "recent_posts": data['analyzed_posts']
+        }
+        
+        # Skip the Orchestrator when its answer is already known: PRIMING
+        # always means log_and_monitor, and an unchanged signal means the
+        # last decision still stands.
+        signature = decision_signature(happiness_snapshot["state"], data)
+        if happiness_snapshot["state"] == "PRIMING":
+            decision = {
+                "action": "log_and_monitor",
+                "parameters": {"reason": "Region is PRIMING; not enough events yet to trust the happiness state."}
+            }
+        elif region in last_decisions and last_decisions[region][0] == signature:
+            logger.info(f"⏭️ [Agent 4] No signal change for {region}, reusing last decision.")
+            decision = last_decisions[region][1]
+        else:
+            decision = await get_proactive_decision(region, final_bundle)
+            if decision:
+                last_decisions[region] = (signature, decision)
+        
+        if decision:
+            # One summary line per region; the full decision dict is a DEBUG dump
+            logger.info(f"--- 💡 FINAL ACTION for {region}: {decision.get('action')} ---")
+            logger.debug(decision)
+            
+            # --- NEW ADDITION: Send the report to the second server ---
+            # We send the decision *and* the data that led to it.
+            # The upload runs in the background while we move on to the
+            # next region's decision.
+            full_report = {
+                "region": region,
+                "decision": decision,
+                "data_bundle": final_bundle
+            }
+            run_in_background(send_report_to_server(full_report))
+            # --- END NEW ADDITION ---
+            
+        else:
+            logger.info(f"--- 💡 FINAL ACTION for {region}: none (no decision was returned from the agent) ---")
+
+async def run_agent_loop():
+    """Processes each batch of events as the simulator pushes it."""
     tracker = HappinessTracker()
+    last_decisions = {}
     start_time = time.time()
     last_plot_time = start_time
     GRAPH_INTERVAL_SECONDS = 60
     
     try:
-        while True:
-            events = fetch_latest_data()
-            
+        async for events in stream_events():
             if not events:
-                time.sleep(5)
                 continue
                 
-            print(f"\n--- Received {len(events)} new events at {time.strftime('%H:%M:%S')} ---")
-            
-            # --- LOOP 1: PERCEIVE & ANALYZE ---
-            grouped_data = {}
-            for event in events:
-                region = event.get('region')
-                if not region:
-                    continue 
-                
-                if region not in grouped_data:
-                    grouped_data[region] = {
-                        "network_metrics": [],
-                        "analyzed_posts": []
-                    }
-                
-                etype = event['event_type']
-                if etype == 'network_metric':
-                    grouped_data[region]["network_metrics"].append(event)
-                elif etype in ('social_media_post', 'support_interaction'):
-                    text = event.get('text') or event.get('log')
-                    if not text:
-                        continue
-                        
-                    analysis = get_event_analysis(text)
-                    if analysis:
-                        score_map = {'positive': 1, 'negative': -1, 'neutral': 0}
-                        score = score_map.get(analysis.get('sentiment', 'neutral'), 0)
-                        tracker.add_sentiment_score(region, score)
-                        event['analysis'] = analysis
-                        grouped_data[region]["analyzed_posts"].append(event)
-            
-            # --- LOOP 2: DECIDE & ACT ---
-            for region, data in grouped_data.items():
-                if region == 'global' or (not data['network_metrics'] and not data['analyzed_posts']):
-                    continue 
-                
-                happiness_snapshot = tracker.get_region_snapshot(region)
-                final_bundle = {
-                    "happiness_state": happiness_snapshot,
-                    "network_metrics": data['network_metrics'],
-                    "recent_posts": data['analyzed_posts']
-                }
-                
-                decision = get_proactive_decision(region, final_bundle)
-                
-                print(f"--- 💡 FINAL ACTION for {region} ---")
-                if decision:
-                    print(json.dumps(decision, indent=2))
-                    
-                    # --- NEW ADDITION: Send the report to the second server ---
-                    # We send the decision *and* the data that led to it
-                    full_report = {
-                        "region": region,
-                        "decision": decision,
-                        "data_bundle": final_bundle
-                    }
-                    send_report_to_server(full_report)
-                    # --- END NEW ADDITION ---
-                    
-                else:
-                    print("No decision was returned from the agent.")
-                print("-" * 40 + "\n")
+            logger.info(f"\n--- Received {len(events)} new events at {time.strftime('%H:%M:%S')} ---")
             
+            await process_tick(tracker, events, last_decisions)
             
             # --- Check timer and print graph ---
             current_time = time.time()
             if current_time - last_plot_time > GRAPH_INTERVAL_SECONDS:
                 print_happiness_graphs(tracker)
                 last_plot_time = current_time # Reset timer
+    finally:
+        # Let in-flight report uploads finish before shutting down
+        await asyncio.gather(*BACKGROUND_TASKS, return_exceptions=True)
+        await HTTP_CLIENT.aclose()
 
-            # Wait for the next tick (matches your simulator)
-            time.sleep(5) 
-            
+def main():
+    logger.info("--- 🚀 Real-Time AGENTIC Listener START ---")
+    logger.info(f"Listening for events on {SIMULATOR_STREAM_URL}...")
+    logger.info("Press Ctrl+C to stop.\n")
+    
+    try:
+        asyncio.run(run_agent_loop())
     except KeyboardInterrupt:
-        print("\n--- 🛑 Agentic Listener Stopped ---")
+        logger.info("\n--- 🛑 Agentic Listener Stopped ---")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
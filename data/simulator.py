@@ -1,14 +1,21 @@
 import google.generativeai as genai
+import asyncio
 import os
 import time
 import random
-import json
+import orjson
 import sys
-import threading
-import http.server
-import socketserver
+import logging
+from aiohttp import web
 from dotenv import load_dotenv
 
+# --- LOGGING ---
+# Shared queued logger (see queued_logging.py in the repo root).
+# Set LOG_LEVEL=DEBUG to also see the verbose per-event dumps.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from queued_logging import get_logger
+logger = get_logger("simulator")
+
 # --- 1. DEFINE REGION PROFILES ---
 # We've added a "display_name" key for the clean JSON output.
 REGION_PROFILES = [
@@ -43,41 +50,86 @@ REGION_PROFILES = [
 ]
 
 # --- 2. WEB SERVER SETUP ---
-# Global variable to hold the latest JSON data for the web server
-LATEST_EVENTS_JSON = "[]"
-# Thread-safe lock
-EVENTS_LOCK = threading.Lock()
+# The server runs on the simulator's own event loop, so no locking is needed.
+# Latest events, already encoded as JSON bytes (encoded once per tick)
+LATEST_EVENTS_BYTES = b"[]"
+# One queue per connected /events (SSE) client
+SUBSCRIBERS = set()
+# Ticks buffered per slow client before the oldest is dropped
+SUBSCRIBER_QUEUE_SIZE = 10
 
-class MyRequestHandler(http.server.SimpleHTTPRequestHandler):
-    """
-    A simple HTTP request handler that serves the latest JSON data.
-    """
-    def do_GET(self):
-        global LATEST_EVENTS_JSON
-        self.send_response(200)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Access-Control-Allow-Origin", "*") # Good for hackathons
-        self.end_headers()
-        
-        # Read the global variable in a thread-safe way
-        with EVENTS_LOCK:
-            json_payload = LATEST_EVENTS_JSON
-        
-        self.wfile.write(json_payload.encode('utf-8'))
+async def handle_latest(request):
+    """GET / -- returns the latest batch of events as JSON."""
+    return web.Response(
+        body=LATEST_EVENTS_BYTES,
+        content_type="application/json",
+        headers={"Access-Control-Allow-Origin": "*"} # Good for hackathons
+    )
+
+async def handle_events(request):
+    """GET /events -- pushes every new batch as a Server-Sent Event."""
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "Access-Control-Allow-Origin": "*"
+    })
+    await response.prepare(request)
 
-def start_web_server(port=8000):
+    subscriber = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    SUBSCRIBERS.add(subscriber)
+    try:
+        while True:
+            payload = await subscriber.get()
+            if payload is None:
+                break # Server is shutting down
+            # orjson output has no newlines, so it fits in a single data line
+            await response.write(b"data: " + payload + b"\n\n")
+    except ConnectionResetError:
+        pass # Client went away
+    finally:
+        SUBSCRIBERS.discard(subscriber)
+    return response
+
+def _push(subscriber, payload):
+    """Queues a payload, dropping the oldest tick for slow clients."""
+    if subscriber.full():
+        subscriber.get_nowait()
+    subscriber.put_nowait(payload)
+
+def publish_events(payload):
+    """Stores the latest batch and pushes it to every SSE subscriber."""
+    global LATEST_EVENTS_BYTES
+    LATEST_EVENTS_BYTES = payload
+    for subscriber in SUBSCRIBERS:
+        _push(subscriber, payload)
+
+async def close_subscribers(app):
+    """Ends open SSE streams so shutdown doesn't wait on them."""
+    for subscriber in SUBSCRIBERS:
+        _push(subscriber, None)
+
+async def start_web_server(port=8000):
     """
-    Starts the HTTP server in a separate, daemon thread.
+    Starts the HTTP server on the running event loop.
+    Returns the runner (for cleanup), or None if the port is unavailable.
     """
+    app = web.Application()
+    app.on_shutdown.append(close_subscribers)
+    app.add_routes([
+        web.get("/", handle_latest),
+        web.get("/events", handle_events)
+    ])
+    runner = web.AppRunner(app)
+    await runner.setup()
     try:
-        httpd = socketserver.TCPServer(("", port), MyRequestHandler)
-        print(f"--- 🌐 Serving real-time data at http://localhost:{port} ---")
-        server_thread = threading.Thread(target=httpd.serve_forever)
-        server_thread.daemon = True # This allows the program to exit
-        server_thread.start()
+        await web.TCPSite(runner, port=port).start()
+        logger.info(f"--- 🌐 Serving real-time data at http://localhost:{port} (SSE stream at /events) ---")
+        return runner
     except OSError:
-        print(f"--- ❗️ COULD NOT START WEB SERVER on port {port}. Is it already in use? ---")
-        print("Simulator will run without the web server.")
+        logger.warning(f"--- ❗️ COULD NOT START WEB SERVER on port {port}. Is it already in use? ---")
+        logger.warning("Simulator will run without the web server.")
+        await runner.cleanup()
+        return None
 
 # --- 3. GENERATOR FUNCTIONS (MODIFIED) ---
 
@@ -112,70 +164,181 @@ def generate_app_crash():
         }
     return None
 
-def generate_tweet(model, region_profile):
-    """Generates a simulated tweet using Gemini, biased by region."""
+def _parse_batch_response(response, region_profiles, key):
+    """
+    Maps a JSON array of {"region": ..., key: ...} objects from Gemini back
+    to the region profiles, keyed by display name.
+    """
+    by_region = {}
+    for item in orjson.loads(response.text):
+        if isinstance(item, dict) and item.get(key):
+            by_region[item.get("region")] = item[key].strip()
+    return [(region, by_region.get(region["display_name"])) for region in region_profiles]
+
+async def generate_tweets(model, region_profiles):
+    """Generates one simulated tweet per region with a single Gemini call."""
     
     # The prompt still uses the internal "name" for context
+    region_lines = "\n".join(
+        f'- region "{r["display_name"]}": a user from {r["name"]}. Bias: {r["prompt_bias"]}'
+        for r in region_profiles
+    )
     prompt = f"""
-    You are a social media user from {region_profile['name']}. 
-    Generate one single, realistic tweet about T-Mobile. 
-    The tweet must be short, like a real tweet, and include a relevant hashtag.
-    
-    Apply this regional bias: {region_profile['prompt_bias']}
+    You are simulating social media users. For each region below, generate
+    one single, realistic tweet about T-Mobile written by a user from that region.
+    Each tweet must be short, like a real tweet, and include a relevant hashtag.
+    Apply each region's bias.
+
+    {region_lines}
+
+    Respond with a JSON array containing one object per region:
+    [{{"region": "<region>", "text": "<tweet>"}}]
     """
     try:
-        response = model.generate_content(prompt, safety_settings={'HARM_CATEGORY_HARASSMENT': 'BLOCK_NONE'})
-        return {
-            "event_type": "social_media_post",
-            "region": region_profile["display_name"], # MODIFIED
-            "timestamp": time.time(),
-            "source": "X (Twitter)",
-            "text": response.text.strip()
-        }
+        response = await model.generate_content_async(
+            prompt,
+            safety_settings={'HARM_CATEGORY_HARASSMENT': 'BLOCK_NONE'},
+            generation_config={"response_mime_type": "application/json"}
+        )
+        events = []
+        for region, text in _parse_batch_response(response, region_profiles, "text"):
+            if not text:
+                continue
+            events.append({
+                "event_type": "social_media_post",
+                "region": region["display_name"], # MODIFIED
+                "timestamp": time.time(),
+                "source": "X (Twitter)",
+                "text": text
+            })
+        return events
     except Exception as e:
-        print(f"Error generating tweet: {e}")
-        return None
+        logger.error(f"Error generating tweets: {e}")
+        return []
 
-def generate_support_interaction(model, region_profile):
-    """Generates a simulated support interaction, biased by region."""
-    
+def _support_issue_topics(region_profile):
+    """Picks the kind of support issue that fits the region's profile."""
     if region_profile["type"] == "poor":
-        issue_topics = "a network outage, poor signal, or dropped calls"
+        return "a network outage, poor signal, or dropped calls"
     elif region_profile["type"] == "neutral":
-        issue_topics = "a billing question, spotty network, or upgrade eligibility"
+        return "a billing question, spotty network, or upgrade eligibility"
     elif region_profile["type"] == "anomaly_good":
-        issue_topics = "a complex billing dispute, a promotion not being applied, or a rude customer service agent"
+        return "a complex billing dispute, a promotion not being applied, or a rude customer service agent"
     else: # "good"
-        issue_topics = "a simple billing question, upgrade eligibility, or an international plan"
+        return "a simple billing question, upgrade eligibility, or an international plan"
 
+async def generate_support_interactions(model, region_profiles):
+    """Generates one simulated support interaction per region with a single Gemini call."""
+    
     # The prompt still uses the internal "name" for context
+    region_lines = "\n".join(
+        f'- region "{r["display_name"]}": a customer from the {r["name"]} region. '
+        f'The issue must be about: [{_support_issue_topics(r)}].'
+        for r in region_profiles
+    )
     prompt = f"""
-    You are a customer experience simulator. Generate a single, short, simulated 
-    T-Mobile customer service interaction from the {region_profile['name']} region.
-    Randomly pick one format: [short email, chat log, or phone call transcript summary]. 
-    
-    The issue must be about: [{issue_topics}]. 
+    You are a customer experience simulator. For each region below, generate a
+    single, short, simulated T-Mobile customer service interaction.
+    For each one, randomly pick one format: [short email, chat log, or phone call transcript summary]. 
+
+    {region_lines}
     
-    Create both the customer's query and a brief, simulated agent response. 
-    Output it as a single block of text.
+    Create both the customer's query and a brief, simulated agent response,
+    as a single block of text per region.
+
+    Respond with a JSON array containing one object per region:
+    [{{"region": "<region>", "log": "<interaction>"}}]
     """
     try:
-        response = model.generate_content(prompt, safety_settings={'HARM_CATEGORY_HARASSMENT': 'BLOCK_NONE'})
-        return {
-            "event_type": "support_interaction",
-            "region": region_profile["display_name"], # MODIFIED
-            "timestamp": time.time(),
-            "channel": random.choice(['email', 'chat', 'phone']),
-            "log": response.text.strip()
-        }
+        response = await model.generate_content_async(
+            prompt,
+            safety_settings={'HARM_CATEGORY_HARASSMENT': 'BLOCK_NONE'},
+            generation_config={"response_mime_type": "application/json"}
+        )
+        events = []
+        for region, log in _parse_batch_response(response, region_profiles, "log"):
+            if not log:
+                continue
+            events.append({
+                "event_type": "support_interaction",
+                "region": region["display_name"], # MODIFIED
+                "timestamp": time.time(),
+                "channel": random.choice(['email', 'chat', 'phone']),
+                "log": log
+            })
+        return events
     except Exception as e:
-        print(f"Error generating support log: {e}")
-        return None
+        logger.error(f"Error generating support logs: {e}")
+        return []
 
 # --- 4. MAIN SIMULATOR LOOP (MODIFIED) ---
-def main():
+async def tick(model, tick_count):
+    """Builds one tick's events; all Gemini calls for the tick run concurrently."""
+    all_events = []
+    
+    # --- Region-Specific Events ---
+    for region in REGION_PROFILES:
+        all_events.append(generate_network_metrics(region))
+
+    # One Gemini call covers every region
+    tasks = []
+    if tick_count % 3 == 0:
+        logger.info(f"Generating Tweets for {len(REGION_PROFILES)} regions...")
+        tasks.append(generate_tweets(model, REGION_PROFILES))
+    if tick_count % 10 == 0:
+        logger.info(f"Generating Support Logs for {len(REGION_PROFILES)} regions...")
+        tasks.append(generate_support_interactions(model, REGION_PROFILES))
+
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error(f"Error generating events: {result}")
+        else:
+            all_events.extend(result)
     
-    global LATEST_EVENTS_JSON # Make this accessible
+    # --- Global Events ---
+    crash = generate_app_crash()
+    if crash:
+        all_events.append(crash)
+
+    return all_events
+
+async def main_async(model, start_time, tick_interval_seconds):
+    
+    # --- START WEB SERVER ---
+    runner = await start_web_server()
+
+    try:
+        await run_ticks(model, start_time, tick_interval_seconds)
+    finally:
+        if runner:
+            await runner.cleanup()
+
+async def run_ticks(model, start_time, tick_interval_seconds):
+    """Generates a new batch of events every tick and publishes it."""
+    tick_count = 0
+
+    while True:
+        tick_count += 1
+        elapsed_time = round(time.time() - start_time, 1)
+        
+        logger.info(f"\n--- TICK {tick_count} (Running for: {elapsed_time}s) ---")
+        
+        all_events = await tick(model, tick_count)
+
+        # --- UPDATE WEB SERVER DATA ---
+        # Compact encoding for the wire, pushed to SSE clients right away
+        publish_events(orjson.dumps(all_events))
+
+        # --- CONSOLE OUTPUT ---
+        # Full event dumps are verbose; only queue them when DEBUG is on
+        if logger.isEnabledFor(logging.DEBUG):
+            for event in all_events:
+                logger.debug(event)
+                logger.debug("---")
+
+        await asyncio.sleep(tick_interval_seconds)
+
+def main():
     
     # --- Config ---
     TICK_INTERVAL_SECONDS = 5 
@@ -184,69 +347,29 @@ def main():
     load_dotenv()
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
-        print("Error: GEMINI_API_KEY not found. Please set it in a .env file.")
+        logger.error("Error: GEMINI_API_KEY not found. Please set it in a .env file.")
         return
         
     genai.configure(api_key=api_key)
     model = genai.GenerativeModel('gemini-flash-lite-latest') # Using Flash for speed
     
-    print(f"--- 🚀 T-Mobile Real-Time Simulator START 🚀 ---")
-    
-    # --- START WEB SERVER ---
-    start_web_server()
+    logger.info(f"--- 🚀 T-Mobile Real-Time Simulator START 🚀 ---")
     
-    print(f"\nGenerating new data every {TICK_INTERVAL_SECONDS} seconds...")
-    print(f"Press Ctrl+C to stop.")
+    logger.info(f"\nGenerating new data every {TICK_INTERVAL_SECONDS} seconds...")
+    logger.info(f"Press Ctrl+C to stop.")
     
     start_time = time.time()
-    tick_count = 0
 
     try:
-        while True:
-            tick_count += 1
-            elapsed_time = round(time.time() - start_time, 1)
-            
-            print(f"\n--- TICK {tick_count} (Running for: {elapsed_time}s) ---")
-            
-            all_events = []
-            
-            # --- Region-Specific Events ---
-            for region in REGION_PROFILES:
-                all_events.append(generate_network_metrics(region))
-                if tick_count % 3 == 0:
-                    print(f"Generating Tweet for {region['display_name']}...")
-                    tweet = generate_tweet(model, region)
-                    if tweet:
-                        all_events.append(tweet)
-                if tick_count % 10 == 0:
-                    print(f"Generating Support Log for {region['display_name']}...")
-                    support_log = generate_support_interaction(model, region)
-                    if support_log:
-                        all_events.append(support_log)
-            
-            # --- Global Events ---
-            crash = generate_app_crash()
-            if crash:
-                all_events.append(crash)
-
-            # --- UPDATE WEB SERVER DATA (THREAD-SAFE) ---
-            with EVENTS_LOCK:
-                LATEST_EVENTS_JSON = json.dumps(all_events, indent=2)
-
-            # --- CONSOLE OUTPUT ---
-            for event in all_events:
-                print(json.dumps(event, indent=2))
-                print("---") 
-
-            time.sleep(TICK_INTERVAL_SECONDS)
+        asyncio.run(main_async(model, start_time, TICK_INTERVAL_SECONDS))
 
     except KeyboardInterrupt:
-        print(f"\n\n--- 🛑 SIMULATOR STOPPED BY USER ---")
-        print(f"Total runtime: {round(time.time() - start_time, 1)} seconds.")
+        logger.info(f"\n\n--- 🛑 SIMULATOR STOPPED BY USER ---")
+        logger.info(f"Total runtime: {round(time.time() - start_time, 1)} seconds.")
         sys.exit(0)
     except Exception as e:
-        print(f"\n--- ❗️ CRITICAL ERROR ---")
-        print(e)
+        logger.error(f"\n--- ❗️ CRITICAL ERROR ---")
+        logger.error(e)
         sys.exit(1)
 
 
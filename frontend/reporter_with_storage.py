@@ -4,52 +4,129 @@ Save this as: reporter_with_storage.py
 """
 
 import http.server
-import socketserver
-import json
+import orjson
 import time
+import hashlib
+import gzip
 from collections import deque
 from datetime import datetime
+from email.utils import formatdate
+from urllib.parse import urlsplit, parse_qs
 import threading
 
 # --- CONFIGURATION ---
 PORT = 8001
 MAX_HISTORY = 200  # Keep last 200 reports
+GZIP_MIN_BYTES = 500  # Smaller GET bodies aren't worth compressing
 
 # Shared data store (thread-safe with a lock)
+# Reports are kept as (seq, JSON bytes) so they are only ever encoded once
 data_store = {
     'reports': deque(maxlen=MAX_HISTORY),
+    'last_seq': 0,           # Sequence number of the newest report
+    'last_modified': None,   # Unix time of the newest report
     'lock': threading.Lock()
 }
 
+# Last GET /reports body, reused until a new report arrives
+response_cache = {
+    'key': None,   # (since, last_seq) the body was built for
+    'body': None,
+    'gzip_body': None,  # Compressed copy of 'body', built on first gzip request
+    'etag': None,
+    'lock': threading.Lock()  # GETs run on concurrent handler threads
+}
+
 class MyReportHandler(http.server.BaseHTTPRequestHandler):
     """Request handler that stores incoming reports"""
+
+    # HTTP/1.1 keeps connections alive between requests (every response
+    # sends a Content-Length), so clients don't reconnect per report/poll.
+    protocol_version = "HTTP/1.1"
     
-    def _send_response(self, status_code, message):
-        """Helper to send a JSON response."""
+    def _send_bytes(self, status_code, body, headers=None):
+        """Helper to send an already-encoded JSON body (may be empty)."""
         self.send_response(status_code)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
         self.send_header('Access-Control-Allow-Origin', '*') 
         self.send_header('Access-Control-Allow-Methods', 'POST, GET, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Content-Encoding')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(json.dumps(message).encode('utf-8'))
+        self.wfile.write(body)
+
+    def _send_response(self, status_code, message):
+        """Helper to send a JSON response."""
+        self._send_bytes(status_code, orjson.dumps(message))
 
     def do_GET(self):
         """
         NEW: Handle GET requests to retrieve stored reports
         Streamlit will call this endpoint to get data
+
+        GET /reports?since=<seq> only returns reports with a higher 'seq'.
+        Responses carry an ETag; a matching If-None-Match gets a bodyless 304.
+        Bodies are gzip-compressed for clients that send Accept-Encoding: gzip.
         """
-        if self.path == '/reports':
+        url = urlsplit(self.path)
+        if url.path == '/reports':
             try:
-                with data_store['lock']:
-                    # Convert deque to list for JSON serialization
-                    reports_list = list(data_store['reports'])
-                
-                self._send_response(200, {
-                    "status": "ok",
-                    "count": len(reports_list),
-                    "reports": reports_list
-                })
+                try:
+                    since = int(parse_qs(url.query).get('since', ['0'])[0])
+                except ValueError:
+                    self._send_response(400, {"status": "error", "message": "'since' must be an integer"})
+                    return
+
+                wants_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+                with response_cache['lock']:
+                    with data_store['lock']:
+                        last_seq = data_store['last_seq']
+                        last_modified = data_store['last_modified']
+                        is_stale = response_cache['key'] != (since, last_seq)
+                        if is_stale and since <= last_seq:
+                            encoded = [report for seq, report in data_store['reports'] if seq > since]
+
+                    if is_stale and since <= last_seq:
+                        # Splice the pre-encoded reports into the envelope
+                        body = (
+                            b'{"status":"ok","count":%d,"last_seq":%d,"reports":[' % (len(encoded), last_seq)
+                            + b','.join(encoded)
+                            + b']}'
+                        )
+                        response_cache.update(
+                            key=(since, last_seq),
+                            body=body,
+                            gzip_body=None,
+                            etag=f'"{hashlib.sha1(body).hexdigest()}"'
+                        )
+                    body, etag = response_cache['body'], response_cache['etag']
+
+                    use_gzip = wants_gzip and body is not None and len(body) >= GZIP_MIN_BYTES
+                    if use_gzip:
+                        # Repetitive JSON compresses well; compress once per cached body
+                        if response_cache['gzip_body'] is None:
+                            response_cache['gzip_body'] = gzip.compress(body, compresslevel=6)
+                        body = response_cache['gzip_body']
+
+                # A cursor from the future means the server restarted
+                if since > last_seq:
+                    self._send_response(400, {"status": "error", "message": "Unknown cursor", "last_seq": last_seq})
+                    return
+
+                headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+                if use_gzip:
+                    # Each encoding is its own representation, so it gets its own ETag
+                    etag = etag[:-1] + '-gzip"'
+                    headers.update({'ETag': etag, 'Content-Encoding': 'gzip'})
+                if last_modified is not None:
+                    headers['Last-Modified'] = formatdate(last_modified, usegmt=True)
+
+                if self.headers.get('If-None-Match') == etag:
+                    self._send_bytes(304, b'', headers)
+                else:
+                    self._send_bytes(200, body, headers)
             except Exception as e:
                 print(f"❗️ Error processing GET request: {e}")
                 self._send_response(500, {"status": "error", "message": str(e)})
@@ -61,7 +138,10 @@ class MyReportHandler(http.server.BaseHTTPRequestHandler):
         try:
             content_length = int(self.headers['Content-Length'])
             post_data_bytes = self.rfile.read(content_length)
-            post_data_json = json.loads(post_data_bytes.decode('utf-8'))
+            if self.headers.get('Content-Encoding') == 'gzip':
+                post_data_bytes = gzip.decompress(post_data_bytes)
+            # orjson parses the raw bytes directly, no decode step needed
+            post_data_json = orjson.loads(post_data_bytes)
             
             # Add server timestamp and wrap the received data
             report_with_timestamp = {
@@ -69,21 +149,29 @@ class MyReportHandler(http.server.BaseHTTPRequestHandler):
                 'data': post_data_json  # <--- This is the key part
             }
             
-            # Store the report (thread-safe)
+            # Store the report (thread-safe), tagged with a monotonic
+            # sequence number that clients use as their 'since' cursor.
+            # It is serialized once here; GETs reuse the bytes as-is.
             with data_store['lock']:
-                data_store['reports'].append(report_with_timestamp)
+                data_store['last_seq'] += 1
+                report_with_timestamp['seq'] = data_store['last_seq']
+                data_store['last_modified'] = time.time()
+                data_store['reports'].append(
+                    (data_store['last_seq'], orjson.dumps(report_with_timestamp))
+                )
             
             # Print to console
             print("\n" + "="*50)
             print(f"✅ RECEIVED REPORT at {time.strftime('%H:%M:%S')}")
             print("="*50)
-            print(json.dumps(post_data_json, indent=2))
+            print(orjson.dumps(post_data_json, option=orjson.OPT_INDENT_2).decode())
             print("="*50 + "\n")
             
             self._send_response(200, {"status": "ok", "message": "Report received"})
         
         except Exception as e:
             print(f"❗️ Error processing POST request: {e}")
+            self.close_connection = True  # The request body may be only partly read
             self._send_response(500, {"status": "error", "message": str(e)})
 
     def do_OPTIONS(self):
@@ -97,7 +185,8 @@ class MyReportHandler(http.server.BaseHTTPRequestHandler):
 def run_server():
     """Starts the server"""
     try:
-        with socketserver.TCPServer(("", PORT), MyReportHandler) as httpd:
+        # One thread per connection, so an idle keep-alive client can't block the rest
+        with http.server.ThreadingHTTPServer(("", PORT), MyReportHandler) as httpd:
             print(f"--- 🚀 Report Server START ---")
             print(f"Listening on http://localhost:{PORT}")
             print(f"GET  http://localhost:{PORT}/reports - Fetch stored reports")
@@ -9,23 +9,63 @@ To run:
 import streamlit as st
 import requests
 import pandas as pd
-import time
-from datetime import datetime
+import orjson
 import numpy as np 
+import altair as alt
 
 # --- CONFIGURATION ---
 REPORTER_URL = "http://localhost:8001/reports"
 REFRESH_SECONDS = 5  # How often to fetch new data
+ACTION_LOG_ROWS = 100  # Newest decisions shown in the action log
+HISTORY_WINDOW = pd.Timedelta(minutes=30)  # How much history the dashboard keeps
 
-st.set_page_config(layout="wide")
+# Page config only needs to be sent once per session; the live panel below
+# is a fragment, so the title and layout here don't run on each refresh.
+if 'cfg' not in st.session_state:
+    st.set_page_config(layout="wide")
+    st.session_state.cfg = True
 st.title("🤖 Live Happiness & Network Dashboard")
 
+@st.cache_resource
+def get_session():
+    """
+    One HTTP session shared across reruns, so each refresh reuses the
+    pooled keep-alive connection to the report server (which speaks
+    HTTP/1.1 and keeps connections open between requests).
+    """
+    session = requests.Session()
+    # The report server gzips its JSON bodies when asked to
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def reset_history():
+    """Forgets all cached reports so the next fetch starts from scratch."""
+    st.session_state.df = None
+    st.session_state.wide = None
+    # Bumped whenever the wide frame changes; never reset, so a chart cached
+    # before a reset can't match a later version
+    st.session_state.wide_version = st.session_state.get('wide_version', 0) + 1
+    st.session_state.delta_key = None
+    st.session_state.latest_scores_by_region = {}
+    st.session_state.last_seq = 0
+
 def fetch_data():
-    """Fetches the complete report list from the server."""
+    """
+    Fetches only the reports newer than our cursor (st.session_state.last_seq).
+    Returns the server's JSON payload, or None on error.
+    """
     try:
-        response = requests.get(REPORTER_URL)
+        session = get_session()
+        response = session.get(REPORTER_URL, params={"since": st.session_state.last_seq}, timeout=(2, 5))
+        if response.status_code == 400 and st.session_state.last_seq:
+            # The server doesn't know our cursor (e.g. it restarted): full fetch
+            reset_history()
+            response = session.get(REPORTER_URL, params={"since": 0}, timeout=(2, 5))
         response.raise_for_status()  # Raise an error for bad responses (4xx, 5xx)
-        return response.json().get('reports', [])
+        return orjson.loads(response.content)
     except requests.exceptions.ConnectionError:
         st.error(f"ConnectionError: Could not connect to the report server at {REPORTER_URL}. Is it running?", icon="🔌")
         return None
@@ -33,144 +73,281 @@ def fetch_data():
         st.error(f"An error occurred while fetching data: {e}", icon="🔥")
         return None
 
+# Flattened json_normalize column -> dashboard column
+REPORT_COLUMNS = {
+    'data.region': 'region',
+    'data.data_bundle.happiness_state.short_term_avg': 'short_term_avg',
+    'data.data_bundle.happiness_state.long_term_avg': 'long_term_avg',
+    'data.data_bundle.happiness_state.short_term_scores': 'short_term_scores',
+    'data.data_bundle.network_metrics': 'network_metrics',
+    'data.decision.action': 'action',
+    'data.decision.parameters.reason': 'reason',
+    'data.decision.parameters.summary': 'summary',
+}
+
+def to_float32(values):
+    """Coerces a column to a float32 array (anything non-numeric becomes NaN)."""
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float32)
+
 def process_data(reports):
-    """Converts the raw report list into a clean Pandas DataFrame."""
-    processed_data = []
-    
+    """
+    Converts the raw report list into a clean Pandas DataFrame plus a
+    {region: short_term_scores} dict holding each region's newest scores.
+    The variable-length score lists stay out of the DataFrame so it is
+    purely numeric/categorical.
+    """
     # Define all columns we want
     cols = [
         'timestamp', 'region', 'short_term_avg', 'long_term_avg', 
-        'latency_ms', 'packet_loss_percent', 'short_term_scores',
-        'action', 'reasoning'  # <-- NEW
+        'latency_ms', 'packet_loss_percent',
+        'action', 'reasoning'
     ]
-    
-    if not reports:
-        return pd.DataFrame(columns=cols)
-
-    for report in reports:
-        try:
-            timestamp = datetime.fromisoformat(report['received_at'])
-            region = report['data']['region']
-            data_bundle = report['data'].get('data_bundle', {})
-            decision = report['data'].get('decision', {}) # <-- NEW
-
-            # 1. Extract happiness state
-            happiness_state = data_bundle.get('happiness_state', {})
-            short_term_avg = happiness_state.get('short_term_avg', np.nan)
-            long_term_avg = happiness_state.get('long_term_avg', np.nan)
-            short_term_scores = happiness_state.get('short_term_scores', [])
-
-            # 2. Extract network metrics
-            network_metrics = data_bundle.get('network_metrics', [])
-            latency = np.nan
-            packet_loss = np.nan
-            
-            if network_metrics:
-                first_metric = network_metrics[0]
-                latency = first_metric.get('latency_ms', np.nan)
-                packet_loss = first_metric.get('packet_loss_percent', np.nan)
-
-            # 3. Extract decision (NEW)
-            action = decision.get('action', 'N/A')
-            parameters = decision.get('parameters', {})
-            reason = parameters.get('reason')
-            summary = parameters.get('summary')
-            reasoning = reason or summary or "No details provided." # Gets whichever one exists
-
-            processed_data.append({
-                'timestamp': timestamp,
-                'region': region,
-                'short_term_avg': short_term_avg,
-                'long_term_avg': long_term_avg,
-                'latency_ms': latency,
-                'packet_loss_percent': packet_loss,
-                'short_term_scores': short_term_scores,
-                'action': action,          # <-- NEW
-                'reasoning': reasoning     # <-- NEW
-            })
-        except Exception as e:
-            # Skip reports with processing errors
-            print(f"Skipping report due to processing error: {e}")
-            pass
-            
-    df = pd.DataFrame(processed_data)
-    if not df.empty:
-        df = df.sort_values(by='timestamp')
-    return df
 
-def plot_time_series(df, value_column, title):
-    """Helper function to pivot, fill, and plot a time series."""
-    st.header(f"📈 {title}")
+    # Flatten the nested reports in one pass; keys missing from every
+    # report still get a (NaN) column so the selection below never fails.
+    flat = pd.json_normalize(reports, sep='.', max_level=3)
+    flat = flat.reindex(columns=['received_at', *REPORT_COLUMNS]).rename(columns=REPORT_COLUMNS)
+    # Unparseable timestamps become NaT and are skipped with the other malformed reports
+    flat['received_at'] = pd.to_datetime(flat['received_at'], format='ISO8601', cache=True, errors='coerce')
+    flat = flat.dropna(subset=['received_at', 'region'])
+
+    # Only the first network metric of each report is plotted
+    first_metric = flat['network_metrics'].dropna().astype(object).str[0].dropna()
+    metrics = pd.DataFrame(first_metric.tolist(), index=first_metric.index)
+    metrics = metrics.reindex(index=flat.index, columns=['latency_ms', 'packet_loss_percent'])
     
-    if value_column not in df.columns or df[value_column].isnull().all():
-        st.info(f"No data available for {title} yet.")
-        return
+    # Build each column with its final dtype up front: float32 metrics and
+    # integer-coded categoricals for the small fixed sets of labels.
+    df = pd.DataFrame({
+        'timestamp': flat['received_at'],
+        'region': pd.Categorical(flat['region']),
+        'short_term_avg': to_float32(flat['short_term_avg']),
+        'long_term_avg': to_float32(flat['long_term_avg']),
+        'latency_ms': to_float32(metrics['latency_ms']),
+        'packet_loss_percent': to_float32(metrics['packet_loss_percent']),
+        'short_term_scores': [s if isinstance(s, list) else [] for s in flat['short_term_scores']],
+        'action': pd.Categorical(flat['action'].fillna('N/A')),
+        'reasoning': flat['reason'].combine_first(flat['summary']).fillna("No details provided."),
+    }, columns=[*cols, 'short_term_scores'])
+
+    # The server hands reports out in arrival order, so this is normally
+    # already sorted; the O(n) check only pays for a sort after a clock step.
+    if not df['timestamp'].is_monotonic_increasing:
+        df = df.sort_values(by='timestamp', kind='stable')
+    # Rows are time-ordered, so later reports overwrite earlier ones
+    latest_scores = dict(zip(df['region'], df.pop('short_term_scores')))
+    return df, latest_scores
+
+# Metrics drawn as per-region time series, with their chart titles
+METRIC_TITLES = {
+    'short_term_avg': 'Short-Term Average Happiness',
+    'long_term_avg': 'Long-Term Average Happiness',
+    'latency_ms': 'Network Latency (ms)',
+    'packet_loss_percent': 'Packet Loss (%)',
+}
+METRIC_COLUMNS = list(METRIC_TITLES)
+
+def to_wide(df):
+    """
+    Reshapes rows into a (timestamp x [metric, region]) frame that every
+    time-series chart slices from. Gaps are left as NaN; see extend_wide.
+    """
+    wide = df.set_index(['timestamp', 'region'])[METRIC_COLUMNS]
+    wide = wide[~wide.index.duplicated(keep='last')]
+    wide = wide.unstack('region').sort_index().dropna(axis=1, how='all')
+    # Plain string region labels so frames built from different deltas line up
+    return wide.set_axis(wide.columns.set_levels(wide.columns.levels[1].astype(str), level=1), axis=1)
+
+def extend_wide(wide, delta):
+    """
+    Appends the delta's rows to the already forward-filled wide frame. Only
+    the new rows are filled, seeded with the last known value of every
+    (metric, region) series, so the cost doesn't grow with the history.
+    """
+    delta_wide = to_wide(delta)
+    if wide is None or wide.empty:
+        return delta_wide.ffill()
+    seeded = pd.concat([wide.iloc[[-1]], delta_wide]).ffill().iloc[1:]
+    wide = pd.concat([wide, seeded])
+    if not wide.index.is_monotonic_increasing:
+        wide = wide.sort_index().ffill()  # Out-of-order delta: refill everything once
+    return wide
+
+def build_time_series_chart(wide):
+    """
+    Builds every metric as one faceted Altair chart (a row per metric), so
+    the browser gets a single payload and a single renderer.
+    Returns None when there is nothing to plot.
+    """
+    long_df = (
+        wide.rename_axis(columns=['metric', 'region'])
+        .melt(ignore_index=False)
+        .dropna(subset=['value'])
+        .reset_index()
+    )
+    if long_df.empty:
+        return None
+    long_df['metric'] = long_df['metric'].map(METRIC_TITLES)
+
+    return alt.Chart(long_df).mark_line().encode(
+        x=alt.X('timestamp:T', title=None),
+        y=alt.Y('value:Q', title=None),
+        color='region:N',
+    ).properties(height=150).facet(
+        row=alt.Row('metric:N', title=None, sort=list(METRIC_TITLES.values()))
+    ).resolve_scale(y='independent')
+
+def plot_time_series(wide):
+    """
+    Draws the time series chart. It is only rebuilt when update_history has
+    bumped wide_version; idle refreshes re-emit the chart built last time.
+    """
+    st.header("📈 Time Series")
 
     try:
-        chart_df = df.pivot(index='timestamp', columns='region', values=value_column)
-        chart_df = chart_df.ffill()
-        st.line_chart(chart_df)
+        version = st.session_state.wide_version
+        cached = st.session_state.get('time_series_chart')
+        if cached is None or cached[0] != version:
+            cached = (version, build_time_series_chart(wide))
+            st.session_state.time_series_chart = cached
+        chart = cached[1]
+
+        if chart is None:
+            st.info("No time series data available yet.")
+            return
+        st.altair_chart(chart, use_container_width=True)
     except Exception as e:
-        st.error(f"Could not plot {title}: {e}")
+        st.error(f"Could not plot time series: {e}")
+
+@st.cache_data(ttl=30, max_entries=4)
+def parse_reports(report_keys, _reports):
+    """
+    Cached process_data: keyed only on the reports' received_at values, so a
+    payload we've already seen skips parsing entirely. The leading underscore
+    keeps Streamlit from hashing the (unhashable) report list itself.
+    """
+    return process_data(_reports)
+
+def trim_history(df):
+    """
+    Drops rows older than HISTORY_WINDOW so memory and chart cost stay
+    bounded however long the dashboard runs. The window is measured from
+    the newest report, so it doesn't depend on the server's clock or timezone.
+    """
+    if df.empty:
+        return df
+    cutoff = df['timestamp'].iloc[-1] - HISTORY_WINDOW
+    if df['timestamp'].iloc[0] >= cutoff:
+        return df  # Nothing to drop
+    df = df[df['timestamp'] >= cutoff].reset_index(drop=True)
+    # Regions that fell out of the window shouldn't linger as empty chart series
+    for col in ('region', 'action'):
+        df[col] = df[col].cat.remove_unused_categories()
+    return df
+
+def update_history(payload):
+    """
+    Parses only the newly fetched reports and appends them to the
+    DataFrame cached in session state. Returns the full DataFrame.
+    """
+    reports = payload.get('reports', [])
+    # Cheap check before any parsing: idle refreshes bring no reports, and a
+    # delta we've already appended (same size, same newest report) is skipped
+    delta_key = (len(reports), reports[-1].get('received_at') if reports else None)
+    if st.session_state.df is not None and (not reports or delta_key == st.session_state.delta_key):
+        return st.session_state.df
+    st.session_state.delta_key = delta_key
+
+    delta, latest_scores = parse_reports(tuple(r.get('received_at') for r in reports), reports)
+    st.session_state.latest_scores_by_region.update(latest_scores)
+    cached = st.session_state.df
+    if cached is None or cached.empty:
+        st.session_state.df = delta
+    elif not delta.empty:
+        # Align categories first, otherwise concat falls back to object dtype
+        for col in ('region', 'action'):
+            categories = cached[col].cat.categories.union(delta[col].cat.categories)
+            cached[col] = cached[col].cat.set_categories(categories)
+            delta[col] = delta[col].cat.set_categories(categories)
+        st.session_state.df = pd.concat([cached, delta], ignore_index=True)
+    if not delta.empty:
+        st.session_state.wide = extend_wide(st.session_state.wide, delta)
+        st.session_state.wide_version += 1
+    trimmed = trim_history(st.session_state.df)
+    if trimmed is not st.session_state.df:
+        # Keep the wide frame and latest scores on the same window and regions as the history
+        active_regions = trimmed['region'].cat.categories
+        wide = st.session_state.wide.loc[trimmed['timestamp'].iloc[0]:]
+        st.session_state.wide = wide.loc[:, wide.columns.get_level_values('region').isin(active_regions)]
+        st.session_state.wide_version += 1
+        st.session_state.latest_scores_by_region = {
+            region: scores
+            for region, scores in st.session_state.latest_scores_by_region.items()
+            if region in active_regions
+        }
+    st.session_state.df = trimmed
+    st.session_state.last_seq = payload.get('last_seq', st.session_state.last_seq)
+    return st.session_state.df
 
 # --- MAIN DASHBOARD LOGIC ---
 
-# Fetch and process data
-raw_reports = fetch_data()
+if 'last_seq' not in st.session_state:
+    reset_history()
 
-if raw_reports is not None:
-    df = process_data(raw_reports)
+@st.fragment(run_every=REFRESH_SECONDS)
+def live_panel():
+    """
+    Fetches new reports and redraws the charts. Only this fragment reruns
+    on each refresh; the page config and title above are left untouched.
+    """
+    # Fetch and process data
+    payload = fetch_data()
 
-    if df.empty:
-        st.info("Waiting for the first report from the server...")
-    else:
-        # Get a list of all unique regions
-        all_regions = df['region'].unique()
-        
-        # --- 1. Plot all time series charts ---
-        plot_time_series(df, 'short_term_avg', 'Time Series: Short-Term Average Happiness')
-        plot_time_series(df, 'long_term_avg', 'Time Series: Long-Term Average Happiness')
-        plot_time_series(df, 'latency_ms', 'Time Series: Network Latency (ms)')
-        plot_time_series(df, 'packet_loss_percent', 'Time Series: Packet Loss (%)')
-
-        st.divider()
-
-        # --- 2. Most Recent "Short-Term Scores" (as bar charts) ---
-        st.header("📊 Most Recent: Individual Scores")
-        st.info("These charts show the raw scores from the *most recent* report for each region.")
-
-        cols = st.columns(len(all_regions))
-        for i, region in enumerate(all_regions):
-            with cols[i]:
-                st.subheader(region)
-                last_report_for_region = df[df['region'] == region].iloc[-1]
-                last_scores_list = last_report_for_region['short_term_scores']
+    if payload is not None:
+        df = update_history(payload)
+
+        if df.empty:
+            st.info("Waiting for the first report from the server...")
+        else:
+            # --- 1. Plot all time series charts ---
+            plot_time_series(st.session_state.wide)
+
+            st.divider()
+
+            # --- 2. Most Recent "Short-Term Scores" (as bar charts) ---
+            st.header("📊 Most Recent: Individual Scores")
+            st.info("These charts show the raw scores from the *most recent* report for each region.")
+
+            latest_scores_by_region = st.session_state.latest_scores_by_region
+            cols = st.columns(len(latest_scores_by_region))
+            for i, (region, last_scores_list) in enumerate(latest_scores_by_region.items()):
+                with cols[i]:
+                    st.subheader(region)
                 
-                if last_scores_list:
-                    st.bar_chart(last_scores_list)
-                else:
-                    st.write("No individual scores in last report.")
+                    if last_scores_list:
+                        st.bar_chart(last_scores_list)
+                    else:
+                        st.write("No individual scores in last report.")
         
-        st.divider()
+            st.divider()
 
-        # --- 3. NEW SECTION: Action Log ---
-        st.header("📜 Recent Agent Actions")
-        st.info("This log shows the most recent decisions made by the agent for each region.")
+            # --- 3. NEW SECTION: Action Log ---
+            st.header("📜 Recent Agent Actions")
+            st.info("This log shows the most recent decisions made by the agent for each region.")
         
-        # Select and rename columns for clarity
-        action_df = df[['timestamp', 'region', 'action', 'reasoning']].copy()
-        action_df.rename(columns={'reasoning': 'Reason / Summary'}, inplace=True)
+            # Slice the newest rows first so only they get copied and serialized
+            action_df = df[['timestamp', 'region', 'action', 'reasoning']].tail(ACTION_LOG_ROWS)
+            action_df = action_df.rename(columns={'reasoning': 'Reason / Summary'})
         
-        # Sort by most recent first
-        action_df = action_df.sort_values(by='timestamp', ascending=False)
+            # Sort by most recent first
+            action_df = action_df.sort_values(by='timestamp', ascending=False)
         
-        st.dataframe(action_df, use_container_width=True)
+            st.dataframe(action_df, use_container_width=True)
 
-        # --- 4. Raw Data (for debugging) ---
-        with st.expander("Show Latest Raw Data (Last 10 Reports)"):
-            st.dataframe(df.tail(10))
+            # --- 4. Raw Data (for debugging) ---
+            with st.expander("Show Latest Raw Data (Last 10 Reports)"):
+                st.dataframe(df.tail(10))
 
 # --- Auto-refresh logic ---
-st.caption(f"Page will refresh in {REFRESH_SECONDS} seconds...")
-time.sleep(REFRESH_SECONDS)
-st.rerun()
\ No newline at end of file
+st.caption(f"Data refreshes every {REFRESH_SECONDS} seconds...")
+live_panel()
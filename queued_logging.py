@@ -0,0 +1,50 @@
+# --- queued_logging.py ---
+# Shared logging setup for agent_listener.py and simulator.py.
+# Log records are handed to a background thread that formats and writes
+# them, so console output never blocks the main loop.
+# Set LOG_LEVEL=DEBUG to also see the verbose per-event dumps.
+
+import os
+import sys
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+import orjson
+
+class _JsonFormatter(logging.Formatter):
+    """Pretty-prints dict/list messages with orjson, only when emitted."""
+    def format(self, record):
+        if isinstance(record.msg, (dict, list)):
+            record.msg = orjson.dumps(record.msg, option=orjson.OPT_INDENT_2).decode()
+        return super().format(record)
+
+class _DeferredQueueHandler(QueueHandler):
+    """Queues the raw record; all formatting happens on the listener thread."""
+    def prepare(self, record):
+        return record
+
+_log_queue = queue.SimpleQueue()
+_listener = None
+
+def get_logger(name):
+    """
+    Returns the named logger, wired to the shared queue. Only this logger
+    is attached (not the root), so chatty third-party loggers like httpx,
+    aiohttp.access and chromadb stay at Python's default WARNING output
+    instead of adding a line per request to the queue.
+    """
+    global _listener
+    if _listener is None:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(_JsonFormatter("%(message)s"))
+        _listener = QueueListener(_log_queue, console_handler)
+        _listener.start()
+        atexit.register(_listener.stop) # Flushes pending records on exit
+
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        logger.addHandler(_DeferredQueueHandler(_log_queue))
+        logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
+        logger.propagate = False
+    return logger